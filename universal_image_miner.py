@@ -1,21 +1,44 @@
 import sys
-import json
+import orjson
 import os
 import re
+import hashlib
 import fitz  # PyMuPDF
 import pandas as pd
 import cloudscraper
 import pytesseract
+import tempfile
+import threading
 import time
-from PIL import Image
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from PIL import Image, ImageOps
+from urllib3.util.retry import Retry
 
 # --- CONFIGURATION ---
 LOGIN_URL = "https://devbackend.succeedquiz.com/api/v1/auth/login"
 UPLOAD_URL = "https://devbackend.succeedquiz.com/api/v1/upload"
+UPLOAD_WORKERS = 16  # Concurrent crop/upload threads
+OCR_WORKERS = os.cpu_count() or 1  # Parallel Tesseract batches (one core each)
+# Parallelism comes from running OCR_WORKERS Tesseract processes side by side;
+# stop each one from also spawning its own OpenMP threads and oversubscribing cores.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+OCR_MIN_WIDTH, OCR_MIN_HEIGHT = 50, 20  # Smaller crops cannot hold a readable option list
+OCR_MAX_SIDE = 2000  # Larger crops are downscaled before OCR
+OCR_TIMEOUT = 10  # Seconds per image before a Tesseract run is killed
+EXCEL_READ_ENGINE = "calamine"  # Rust-backed reader (python-calamine)
+CROP_DPI = 200  # High DPI for clear Hotspots/Diagrams
+CROP_MATRIX = fitz.Matrix(CROP_DPI / 72, CROP_DPI / 72)
 
 scraper = cloudscraper.create_scraper()
 
+# Widen the keep-alive pool so concurrent uploads reuse warm TLS connections.
+# Resize cloudscraper's own HTTPS adapter in place rather than mounting a plain
+# HTTPAdapter, which would drop its Cloudflare cipher-suite SSL context.
+_https_adapter = scraper.get_adapter("https://")
+_https_adapter.max_retries = Retry.from_int(2)
+_https_adapter.init_poolmanager(UPLOAD_WORKERS, UPLOAD_WORKERS * 2)
+
 # ----------------- AUTH & UPLOAD -----------------
 
 def login_and_get_token():
@@ -48,9 +71,24 @@ def upload_image_api(image_bytes, filename, token):
 
 # ----------------- COORDINATE CROPPER (SOURCE OF TRUTH) -----------------
 
-def crop_image_from_coords(doc, page_num, bbox_str):
+IMAGE_REF_RE = re.compile(r"<<(IMAGE_REF_\d+)>>")
+
+def extract_image_refs(text):
+    """Strips <<IMAGE_REF_n>> tokens and collects their ids in a single regex pass."""
+    ref_ids = []
+    def _collect(m):
+        ref_ids.append(m.group(1))
+        return ""
+    return IMAGE_REF_RE.sub(_collect, text).strip(), ref_ids
+
+def crop_image_from_coords(page_cache, doc, page_num, bbox_str):
     """
     Precision Cropping using Cirrascale's BBOX (0-100 relative scale).
+    Returns the raw fitz.Pixmap; callers encode only for the consumer that
+    needs it (JPEG for upload, raw samples for OCR).
+    page_cache memoizes {page_idx: (page, display_list, width, height)}:
+    the page's content stream is interpreted once into a display list and
+    every ref on that page rasterizes only its clip from it.
     """
     try:
         parts = [float(x.strip()) for x in bbox_str.split(',')]
@@ -60,32 +98,165 @@ def crop_image_from_coords(doc, page_num, bbox_str):
         page_idx = int(page_num) - 1 
         if page_idx < 0 or page_idx >= len(doc): return None
         
-        page = doc[page_idx]
-        w, h = page.rect.width, page.rect.height
+        if page_idx not in page_cache:
+            page = doc[page_idx]
+            page_cache[page_idx] = (page, page.get_displaylist(), page.rect.width, page.rect.height)
+        _, display_list, w, h = page_cache[page_idx]
 
         clip_rect = fitz.Rect(
             (max(0, xmin)/100)*w, (max(0, ymin)/100)*h,
             (min(100, xmax)/100)*w, (min(100, ymax)/100)*h
         )
-        # High DPI for clear Hotspots/Diagrams
-        return page.get_pixmap(clip=clip_rect, dpi=200).tobytes("jpg")
+        pix = display_list.get_pixmap(matrix=CROP_MATRIX, clip=clip_rect, alpha=False)
+        pix.set_dpi(CROP_DPI, CROP_DPI)  # Page.get_pixmap(dpi=) sets this; the display-list path does not
+        return pix
     except: return None
 
+# ----------------- PARALLEL CROP + UPLOAD -----------------
+
+def upload_image_deduped(img_bytes, filename, token, upload_cache, cache_lock):
+    """
+    Uploads each distinct image once. Exhibits reused across questions crop to
+    identical bytes, so later refs wait on (or reuse) the first upload's URL
+    instead of making another round trip.
+    Failures are not cached: the owner evicts its entry, and a waiter that sees
+    no URL makes its own attempt, so each ref still gets at least one upload try.
+    """
+    digest = hashlib.blake2b(img_bytes, digest_size=16).hexdigest()
+    with cache_lock:
+        entry = upload_cache.get(digest)
+        is_owner = entry is None
+        if is_owner: entry = upload_cache[digest] = {"done": threading.Event(), "url": None}
+
+    if is_owner:
+        try: entry["url"] = upload_image_api(img_bytes, filename, token)
+        finally:
+            if entry["url"] is None:
+                with cache_lock: upload_cache.pop(digest, None)
+            entry["done"].set()
+        return entry["url"]
+
+    entry["done"].wait()
+    if entry["url"] is None:
+        return upload_image_deduped(img_bytes, filename, token, upload_cache, cache_lock)
+    return entry["url"]
+
+def process_image_job(job, upload_cache, cache_lock, token):
+    """
+    Thread worker: upload one rendered crop. job is (idx, ref_id, img_bytes);
+    each crop is rendered on the main thread (PyMuPDF is not thread-safe) and
+    submitted as soon as it is encoded, so workers only do the (slow) network
+    round trip.
+    """
+    idx, ref_id, img_bytes = job
+    if not img_bytes: return None
+
+    # Universal Upload (Hotspots, Exhibits, etc.)
+    return upload_image_deduped(img_bytes, f"q{idx+1}_{ref_id}.jpg", token, upload_cache, cache_lock)
+
 # ----------------- CONSOLIDATION / VERIFICATION -----------------
 
-def verify_and_rescue_text(image_bytes):
+def format_rescued_text(text):
+    """Formats raw OCR output as a semicolon list for the Options column."""
+    clean = [l.strip() for l in text.split('\n') if l.strip()]
+    return "; ".join(clean)
+
+def pixmap_to_image(pix):
+    """Wraps raw pixmap samples as a PIL image (no JPEG encode/decode round-trip)."""
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride, 1)
+
+def to_ocr_pixmap(pix):
+    """Grayscale copy for OCR: a third of the RGB bytes to encode and load, same text."""
+    return fitz.Pixmap(fitz.csGRAY, pix)
+
+def to_ocr_image(pix):
+    """
+    OCR-ready PIL image: grayscale, scaled so the longest side fits OCR_MAX_SIDE
+    (Tesseract's LSTM cost grows with pixel count), contrast-stretched so faint
+    screenshot text is legible on the first pass. Binarization is left to
+    Tesseract, whose default thresholding is already Otsu.
+    """
+    img = pixmap_to_image(to_ocr_pixmap(pix))
+    img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.LANCZOS)  # Exact scale; no-op if it already fits
+    return ImageOps.autocontrast(img, cutoff=1)
+
+def verify_and_rescue_text(path):
     """
     FALLBACK ONLY: If Cirrascale missed the text and gave an image instead,
-    we use Tesseract to consolidate the data.
+    we use Tesseract to consolidate the data. Takes the path of a PNG already
+    written from to_ocr_image (not a PIL image or pixmap), so it makes no
+    PyMuPDF calls and is safe off the main thread.
     """
     try:
-        img = Image.open(BytesIO(image_bytes))
-        text = pytesseract.image_to_string(img)
-        # Format as semicolon list for the Options column
-        clean = [l.strip() for l in text.split('\n') if l.strip()]
-        return "; ".join(clean)
+        return format_rescued_text(pytesseract.image_to_string(path, timeout=OCR_TIMEOUT))
     except: return None
 
+def ocr_image_list(paths, list_path):
+    """
+    OCRs several image files in ONE Tesseract process via an image list file.
+    Returns one text per path; raises if the output cannot be matched up.
+    """
+    with open(list_path, 'w', encoding='utf-8') as f: f.write("\n".join(paths) + "\n")
+    # Tesseract terminates each page of a multi-image run with a form feed
+    pages = pytesseract.image_to_string(list_path, timeout=OCR_TIMEOUT * len(paths)).split("\f")
+    if len(pages) < len(paths): raise ValueError("Tesseract returned fewer pages than images")
+    return pages[:len(paths)]
+
+def batch_rescue_text(rescue_queue):
+    """
+    Runs queued rescues through batched Tesseract processes (image list files),
+    paying engine/traineddata startup once per batch instead of per image.
+    Each Tesseract run uses a single core, so the queue is split into up to
+    OCR_WORKERS contiguous batches that run side by side. Pixel-identical
+    crops are OCR'd once and the text is shared.
+    Returns [(key, rescued_text)] in queue order. A batch whose output cannot
+    be matched back to its inputs (or that times out) falls back to per-image
+    OCR on its own worker; the other batches keep their results.
+    """
+    if not rescue_queue: return []
+
+    # The same exhibit can be queued by several questions: OCR each distinct crop once
+    unique_index = {}  # (width, height, pixel digest) -> position in unique_pix
+    unique_pix, queue_slots = [], []
+    for _, pix in rescue_queue:
+        ident = (pix.width, pix.height, hashlib.blake2b(pix.samples, digest_size=8).digest())
+        if ident not in unique_index:
+            unique_index[ident] = len(unique_pix)
+            unique_pix.append(pix)
+        queue_slots.append(unique_index[ident])
+
+    texts = [None] * len(unique_pix)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Prepare on this thread (PyMuPDF is not thread-safe); workers only see files
+        paths = {}  # position in unique_pix -> prepared PNG
+        for i, pix in enumerate(unique_pix):
+            try:
+                # Lossless PNG of the prepared image; no lossy JPEG pass before OCR
+                path = os.path.join(tmp_dir, f"{i}.png")
+                to_ocr_image(pix).save(path)
+                paths[i] = path
+            except: pass
+        if not paths: return [(key, None) for key, _ in rescue_queue]
+
+        ready = list(paths)
+        size = -(-len(ready) // min(OCR_WORKERS, len(ready)))  # ceil division
+        batches = [ready[i:i + size] for i in range(0, len(ready), size)]
+
+        def run_batch(b, batch):
+            """One Tesseract process per batch; only a failing batch degrades to per-image OCR."""
+            try:
+                pages = ocr_image_list([paths[i] for i in batch], os.path.join(tmp_dir, f"imglist_{b}.txt"))
+                return [format_rescued_text(page) for page in pages]
+            except:
+                return [verify_and_rescue_text(paths[i]) for i in batch]
+
+        with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+            for batch, batch_texts in zip(batches, executor.map(run_batch, range(len(batches)), batches)):
+                for i, text in zip(batch, batch_texts): texts[i] = text
+
+    return [(key, texts[slot]) for (key, _), slot in zip(rescue_queue, queue_slots)]
+
 # ----------------- MAIN -----------------
 
 def main():
@@ -96,68 +267,97 @@ def main():
     coord_path = sys.argv[3]
     output_json = sys.argv[4]
 
-    token = login_and_get_token()
+    # Log in (network round trip) while the inputs are parsed (local CPU/disk)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        login_job = executor.submit(login_and_get_token)
+        try:
+            df = pd.read_excel(input_excel, engine=EXCEL_READ_ENGINE)
+            doc = fitz.open(pdf_path)
+            with open(coord_path, 'rb') as f:
+                raw = orjson.loads(f.read())
+                coord_map = orjson.loads(raw) if isinstance(raw, str) else raw
+        except: return
+        token = login_job.result()
     if not token: return
 
-    try:
-        df = pd.read_excel(input_excel)
-        doc = fitz.open(pdf_path)
-        with open(coord_path, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
-            coord_map = json.loads(raw) if isinstance(raw, str) else raw
-    except: return
-
     result_map = {} 
-    ref_pattern = re.compile(r"<<(IMAGE_REF_\d+)>>")
+    rescue_queue = []  # (question_text, fitz.Pixmap) awaiting batched OCR
 
     print(f"Consolidating V2 Data for {len(df)} questions...")
 
-    for idx, row in df.iterrows():
-        q_text_raw = str(row.get('Question', ''))
-        # Clean text for mapping (stripping tokens)
-        q_text_clean = re.sub(r"<<IMAGE_REF_\d+>>", "", q_text_raw).strip()
+    # 1. Collect every (question, image ref) pair that has coordinates
+    jobs = []
+    # itertuples over just the columns we read; no per-row Series construction
+    rows = df.reindex(columns=["Question", "Question_Type", "Options"], fill_value="")
+    for idx, question, question_type, options in rows.itertuples(index=True, name=None):
+        q_text_raw = str(question)
+        # Clean text for mapping (stripping tokens) + Image References, in one scan
+        q_text_clean, ref_ids = extract_image_refs(q_text_raw)
         
-        q_type = str(row.get('Question_Type', '')).lower()
-        q_options = str(row.get('Options', ''))
+        q_type = str(question_type).lower()
+        q_options = str(options)
+
+        # CONSOLIDATION CHECK (The "Verification" Step)
+        # Did Cirrascale treat a text box as an image by mistake?
+        is_drag_drop = "drag" in q_type or "drop" in q_type
+        is_empty_options = q_options == 'nan' or not q_options.strip()
+        needs_rescue = is_drag_drop and is_empty_options
 
         # Check for Image References (Source of Truth)
-        matches = ref_pattern.findall(q_text_raw)
-        
-        if matches:
-            for ref_id in matches:
-                if ref_id in coord_map:
-                    # 1. Retrieve Data from Source of Truth
-                    meta = coord_map[ref_id]
-                    img_bytes = crop_image_from_coords(doc, meta.get('page', 1), meta.get('coordinates', ''))
-                    
-                    if img_bytes:
-                        # 2. Universal Upload (Hotspots, Exhibits, etc.)
-                        url = upload_image_api(img_bytes, f"q{idx+1}_{ref_id}.jpg", token)
-                        if url:
-                            print(f"Q{idx+1}: Image Mapped -> {url}")
-                            result_map[q_text_raw] = url
-                            result_map[q_text_clean] = url
-
-                        # 3. CONSOLIDATION CHECK (The "Verification" Step)
-                        # Did Cirrascale treat a text box as an image by mistake?
-                        is_drag_drop = "drag" in q_type or "drop" in q_type
-                        is_empty_options = q_options == 'nan' or not q_options.strip()
-
-                        if is_drag_drop and is_empty_options:
-                            print(f"  [WARN] Q{idx+1}: Drag/Drop options missing! Cirrascale gave image instead of text.")
-                            print(f"  -> Attempting Tesseract Rescue...")
-                            
-                            rescued_text = verify_and_rescue_text(img_bytes)
-                            if rescued_text:
-                                # Save with _OCR suffix for Universal Miner to pick up
-                                result_map[q_text_raw + "_OCR"] = rescued_text
-                                print(f"  -> Rescued Text: {rescued_text[:40]}...")
-                            else:
-                                print(f"  -> Rescue Failed. Question may need manual review.")
+        for ref_id in ref_ids:
+            if ref_id in coord_map:
+                jobs.append((idx, q_text_raw, q_text_clean, ref_id, coord_map[ref_id], needs_rescue))
+
+    # 2. Render on the main thread (PyMuPDF is not thread-safe) and hand each crop to
+    #    the upload pool as soon as it is encoded; rescue crops queue for OCR, which
+    #    then runs here while the remaining uploads are still in flight
+    page_cache = {}
+    upload_cache, cache_lock = {}, threading.Lock()  # {bytes digest: {"done": Event, "url": str}}
+    worker = partial(process_image_job, upload_cache=upload_cache, cache_lock=cache_lock, token=token)
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        pending_urls = []  # Futures in job order
+        for idx, q_text_raw, _, ref_id, meta, needs_rescue in jobs:
+            pix = crop_image_from_coords(page_cache, doc, meta.get('page', 1), meta.get('coordinates', ''))
+            pending_urls.append(executor.submit(worker, (idx, ref_id, pix.tobytes("jpg") if pix else None)))
+            if pix is None or not needs_rescue: continue
+
+            print(f"  [WARN] Q{idx+1}: Drag/Drop options missing! Cirrascale gave image instead of text.")
+            # Size gate from pixmap metadata: no decode or Tesseract start for slivers
+            if pix.width < OCR_MIN_WIDTH or pix.height < OCR_MIN_HEIGHT:
+                print(f"  -> Crop too small to OCR ({pix.width}x{pix.height}px). Question may need manual review.")
+                continue
+            # Blank/solid-colour crop (bad coordinates): nothing for Tesseract to read
+            if pix.is_unicolor:
+                print("  -> Crop is a single solid colour. Question may need manual review.")
+                continue
+            print("  -> Queued for Tesseract Rescue...")
+            rescue_queue.append((q_text_raw, pix))
+
+        # 3. BATCHED TESSERACT RESCUE (single engine start per batch), overlapping uploads
+        if rescue_queue:
+            print(f"Running Tesseract Rescue on {len(rescue_queue)} image(s)...")
+        rescued = batch_rescue_text(rescue_queue)
+
+        urls = [future.result() for future in pending_urls]
+
+    # 4. Merge on the main thread so later refs win exactly as in a serial run
+    for (idx, q_text_raw, q_text_clean, _, _, _), url in zip(jobs, urls):
+        if url:
+            print(f"Q{idx+1}: Image Mapped -> {url}")
+            result_map[q_text_raw] = url
+            result_map[q_text_clean] = url
+
+    for key, rescued_text in rescued:
+        if rescued_text:
+            # Save with _OCR suffix for Universal Miner to pick up
+            result_map[key + "_OCR"] = rescued_text
+            print(f"  -> Rescued Text: {rescued_text[:40]}...")
+        else:
+            print(f"  -> Rescue Failed for '{key[:40]}...'. Question may need manual review.")
 
     # Save Final Map
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(result_map, f, indent=4)
+    with open(output_json, 'wb') as f:
+        f.write(orjson.dumps(result_map, option=orjson.OPT_INDENT_2))
 
     print(f"Consolidation Complete. Output: {output_json}")
 
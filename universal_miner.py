@@ -11,9 +11,14 @@ Updates:
 import argparse
 import re
 import json
+import orjson
+import numpy as np
 import pandas as pd
 import uuid
 import hashlib
+import string
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Any
 
@@ -23,46 +28,97 @@ DEFAULT_COLLECTION_NAME = "General Certification"
 DEFAULT_PASSMARK = 70
 DEFAULT_POINTS = 1
 DEFAULT_INSTRUCTOR = "Demo Instructor"
+DEFAULT_QUESTION_TYPE = "multiple_choice"
+EXCEL_READ_ENGINE = "calamine"     # Rust-backed reader (python-calamine)
+EXCEL_WRITE_ENGINE = "xlsxwriter"  # Faster than openpyxl for write-only output
+# Keep MediaUrl etc. as plain strings (no hyperlink objects / 65k-URL sheet limit).
+# constant_memory is NOT enabled: pandas emits cells column by column, and
+# xlsxwriter's streaming mode silently drops writes to already-flushed rows.
+EXCEL_WRITE_OPTIONS = {"strings_to_urls": False}
+# Repeated key/enum columns held as pandas categoricals in the output tables
+# (int codes + one string pool; Parquet stores them dictionary-encoded)
+KEY_CATEGORY_COLUMNS = ["CategoryKey", "CollectionKey", "QuizKey", "QuestionKey", "ScenarioKey", "Type", "Variant"]
+
+# Fixed input schema (missing columns are filled with "")
+INPUT_COLUMNS = [
+    "Question", "Options", "Correct_Options", "Explanation", "Hints", "Scenario",
+    "Question_Type", "Category", "Collection", "Quiz", "has_image"
+]
+# Fields the row loop reads, in itertuples unpacking order (input + precomputed keys)
+LOOP_COLUMNS = [
+    "Question", "Options", "Correct_Options", "Hints", "Scenario", "Question_Type",
+    "Category", "Collection", "Quiz", "CategoryKey", "CollectionKey", "QuizKey",
+    "ScenarioKey", "Variant"
+]
+
+# Output column order per sheet (explicit so pandas skips column inference,
+# and empty tables still export their header row)
+CATEGORY_COLUMNS = ["CategoryKey", "Name", "Description", "Icon", "Color", "IsActive"]
+COLLECTION_COLUMNS = ["CollectionKey", "Name", "CategoryKey", "Difficulty", "IsPublic", "InstructorName"]
+QUIZ_COLUMNS = ["QuizKey", "Title", "CollectionKey", "PassMark", "IsPublic", "Tags"]
+SCENARIO_COLUMNS = ["ScenarioKey", "QuizKey", "Title", "Context", "MediaUrl", "MediaType", "TimeDuration", "Order"]
+QUESTION_COLUMNS = [
+    "QuestionKey", "QuizKey", "Type", "Variant", "Text", "Explanation", "Points",
+    "Order", "ScenarioKey", "ScenarioOrder", "CorrectAnswer", "PartialScoring", "MediaUrl"
+]
+OPTION_COLUMNS = ["QuestionKey", "Text", "IsCorrect", "OrderIndex", "CorrectOrder", "Metadata"]
+HINT_COLUMNS = ["QuestionKey", "HintText", "HintOrder", "PointsDeduction"]
 
 # --------------------- HELPERS ---------------------
 
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9]")
+_HINT_PREFIX_RE = re.compile(r'^\s*hint\s*:\s*', re.IGNORECASE)
+
 def make_key(prefix: str, base: str) -> str:
     """Generates a deterministic key based on content hash."""
     if not base or pd.isna(base): 
         return f"{prefix}_{str(uuid.uuid4())[:8].upper()}"
-    clean = re.sub(r"[^A-Za-z0-9]", "", str(base))
-    content_hash = hashlib.md5(str(base).encode()).hexdigest()[:6].upper()
+    return _content_key(prefix, str(base))
+
+@lru_cache(maxsize=4096)
+def _content_key(prefix: str, base: str) -> str:
+    """Cached body of make_key: Category/Collection/Quiz names repeat on every row."""
+    clean = _NON_ALNUM_RE.sub("", base)
+    content_hash = hashlib.md5(base.encode()).hexdigest()[:6].upper()
     short_name = clean[:10].upper()
     return f"{prefix}_{short_name}_{content_hash}"
 
-def clean_text(text):
-    if pd.isna(text): return ""
-    return str(text).strip()
+def make_keys(prefix: str, values: pd.Series) -> pd.Series:
+    """Column-wise make_key: hashes each distinct value once and maps it back onto the rows."""
+    lookup = {v: make_key(prefix, v) for v in values.unique()}
+    return values.map(lookup)
+
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the whole input in one column-wise pass: every cell becomes a
+    stripped str ("" for missing). Question_Type is also lowercased here once.
+    """
+    df = df.fillna("").astype(str)
+    for col in df.columns:
+        df[col] = df[col].str.strip()
+    df["Question_Type"] = df["Question_Type"].str.lower()
+    return df
 
 def clean_hint_text(h: str) -> str:
     if pd.isna(h) or h is None: return ""
     s = str(h).strip()
-    s = re.sub(r'^\s*hint\s*:\s*', '', s, flags=re.IGNORECASE)
+    s = _HINT_PREFIX_RE.sub('', s)
     return s
 
+# Normalized raw header (lowercase, spaces -> "_", dots dropped) -> standard column name
+COLUMN_MAP = {
+    "question": "Question", "options": "Options", 
+    "correct_options": "Correct_Options", "answers": "Correct_Options",
+    "explanation": "Explanation", "hints": "Hints", "scenario": "Scenario",
+    "question_type": "Question_Type", "type": "Question_Type",
+    "category": "Category", "collection": "Collection", "quiz": "Quiz",
+    "difficulty": "difficulty", "has_image": "has_image",
+    "tag": "Tag", "ispublic": "isPublic"
+}
+
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Standardizes input column names."""
-    cols = {c.lower().replace(" ", "_").replace(".", ""): c for c in df.columns}
-    mapping = {
-        "question": "Question", "options": "Options", 
-        "correct_options": "Correct_Options", "answers": "Correct_Options",
-        "explanation": "Explanation", "hints": "Hints", "scenario": "Scenario",
-        "question_type": "Question_Type", "type": "Question_Type",
-        "category": "Category", "collection": "Collection", "quiz": "Quiz",
-        "difficulty": "difficulty", "has_image": "has_image",
-        "tag": "Tag", "ispublic": "isPublic"
-    }
-    renamed = {}
-    for standard, target in mapping.items():
-        if standard in cols: renamed[cols[standard]] = target
-    
-    df = df.rename(columns=renamed)
-    return df
+    return df.rename(columns=lambda c: COLUMN_MAP.get(str(c).lower().replace(" ", "_").replace(".", ""), c))
 
 # --------------------- TAGGING (V1 LOGIC) ---------------------
 KEYWORD_TAG_MAP = {
@@ -75,14 +131,19 @@ KEYWORD_TAG_MAP = {
     r"\bpower bi\b": "power-bi", r"\bdax\b": "dax", r"\bdata modeling\b": "data-modeling"
 }
 
+# Single alternation over every keyword pattern: one scan per text instead of one per tag
+_KEYWORD_TAG_RE = re.compile("|".join(f"(?P<g{i}>{pat})" for i, pat in enumerate(KEYWORD_TAG_MAP)))
+_GROUP_TO_TAG = {f"g{i}": tag for i, tag in enumerate(KEYWORD_TAG_MAP.values())}
+_EXAM_CODE_RE = re.compile(r"\b([a-z]{1,3}-\d{2,4})\b")  # e.g. "az-104" in a quiz title
+
 def infer_tags(text_content: str, title: str) -> str:
     tags = set()
     if title:
-        m = re.search(r"\b([a-z]{1,3}-\d{2,4})\b", title.lower())
+        m = _EXAM_CODE_RE.search(title.lower())
         if m: tags.add(m.group(1).upper())
     content = text_content.lower()
-    for pat, tag in KEYWORD_TAG_MAP.items():
-        if re.search(pat, content): tags.add(tag)
+    for m in _KEYWORD_TAG_RE.finditer(content):
+        tags.add(_GROUP_TO_TAG[m.lastgroup])
     return ",".join(list(tags)[:8]) 
 
 # --------------------- HOTSPOT LOGIC ---------------------
@@ -101,91 +162,127 @@ def detect_hotspot_variant(q_text, options_str):
     # Default to Click Region (Image Map)
     return "click_region"
 
+def detect_hotspot_variants(df: pd.DataFrame) -> np.ndarray:
+    """Column-wise detect_hotspot_variant(); None for non-hotspot rows."""
+    q_lower = df["Question"].str.lower()
+    opt_lower = df["Options"].str.lower()
+    is_dropdown = q_lower.str.contains("[slot", regex=False) | opt_lower.str.contains("[slot", regex=False)
+    is_yes_no = q_lower.str.contains("select yes", regex=False) | q_lower.str.contains("true or false", regex=False)
+    variants = np.select([is_dropdown, is_yes_no], ["dropdown", "yes_no_matrix"], default="click_region")
+    return np.where(df["Question_Type"] == "hotspot", variants.astype(object), None)
+
 # --------------------- PARSERS ---------------------
 
+# Compiled once at import; parse_options_v2 runs for every row
+_HAS_LETTER_RE = re.compile(r"\b[A-Za-z]\)")
+_SPLIT_LETTER_RE = re.compile(r";\s*(?=[A-Za-z]\))")
+_CORRECT_LETTERS_RE = re.compile(r"\b([A-Za-z])\)")
+_OPT_LETTER_RE = re.compile(r"^([A-Za-z])\)\s*(.*)")
+_LETTERS = string.ascii_uppercase  # Fallback letters for unprefixed options
+
+# Hotspot metadata has a fixed schema, so it is rendered from templates instead of
+# json.dumps per option. Output is byte-identical to json.dumps' default formatting.
+_YES_NO_META = {v: f'{{"variant": "yes_no_matrix", "correctValue": "{v}"}}' for v in ("yes", "no")}
+_DROPDOWN_META_TMPL = '{{"slotId": "SLOT{i}", "label": "Option {i}", "choices": [{t}], "correctChoice": {t}}}'
+_CLICK_META_TMPL = '{{"variant": "click_region", "shape": "rect", "coords": {{"x": 10, "y": {y}, "width": 50, "height": 50}}}}'
+
 def parse_options_v2(question_key, q_type, variant, options_str, correct_str):
+    """Expects clean_columns() output: options_str/correct_str already stripped str ("" if missing)."""
     options_rows = []
-    
-    options_str = clean_text(options_str)
-    correct_str = clean_text(correct_str)
-    
+
     if not options_str: return []
 
     # Regex to split "A) Text"
-    if re.search(r"\b[A-Za-z]\)", options_str):
-        raw_options = re.split(r";\s*(?=[A-Za-z]\))", options_str)
+    if _HAS_LETTER_RE.search(options_str):
+        raw_options = _SPLIT_LETTER_RE.split(options_str)
     else:
         raw_options = options_str.split(';')
 
-    correct_letters = set(re.findall(r"\b([A-Za-z])\)", correct_str))
+    is_sequence = q_type == 'drag_drop'
+    is_hotspot = q_type == 'hotspot'
+
+    # Correct letters packed into an int bitmask (bit = ord(letter) - 65).
+    # Sequences match on text only, so they skip the letter scan entirely.
+    correct_mask = 0
+    if not is_sequence:
+        for c in _CORRECT_LETTERS_RE.findall(correct_str):
+            correct_mask |= 1 << (ord(c) - 65)
     
     for idx, opt_raw in enumerate(raw_options, 1):
         opt_text = opt_raw.strip()
         
         # Strip Letter Prefix
-        match = re.match(r"^([A-Za-z])\)\s*(.*)", opt_text)
+        match = _OPT_LETTER_RE.match(opt_text)
         if match:
             letter = match.group(1).upper()
             text_body = match.group(2)
         else:
-            letter = chr(64 + idx)
+            letter = _LETTERS[idx - 1] if idx <= len(_LETTERS) else chr(64 + idx)
             text_body = opt_text
         
-        is_correct = False
-        
         # Correctness Logic
-        if q_type == 'drag_drop':
+        if is_sequence:
             # For sequence, if it exists in correct string, it's a valid item
-            if text_body in correct_str: is_correct = True
+            is_correct = text_body in correct_str
         else:
             # For MCQ/Hotspot
-            if letter in correct_letters: is_correct = True
-            elif text_body in correct_str and len(text_body) > 1: is_correct = True
+            is_correct = bool(correct_mask >> (ord(letter) - 65) & 1) or (len(text_body) > 1 and text_body in correct_str)
 
         # --- METADATA GENERATION ---
         metadata_json = None
         
-        if q_type == 'hotspot':
+        if is_hotspot:
             if variant == 'yes_no_matrix':
                 # For Matrix: Text is the statement. Correctness = Yes/No.
-                metadata_json = json.dumps({
-                    "variant": "yes_no_matrix",
-                    "correctValue": "yes" if is_correct else "no"
-                })
+                metadata_json = _YES_NO_META["yes" if is_correct else "no"]
                 is_correct = True # Row must exist
                 
             elif variant == 'dropdown':
                 # Special parsing for Dropdown: "A) [SLOT1] Label | Choice1, Choice2"
                 # If pure text, we default to basic structure
-                metadata_json = json.dumps({
-                    "slotId": f"SLOT{idx}",
-                    "label": f"Option {idx}",
-                    "choices": [text_body], # In a real scenario, we'd extract distractors
-                    "correctChoice": text_body
-                })
+                # choices: in a real scenario, we'd extract distractors
+                text_json = json.dumps(text_body)
+                metadata_json = _DROPDOWN_META_TMPL.format(i=idx, t=text_json)
                 is_correct = True
                 
             else:
                 # Default: Click Region
                 # We put dummy coords so it imports. User draws box in UI.
-                metadata_json = json.dumps({
-                    "variant": "click_region",
-                    "shape": "rect",
-                    "coords": {"x": 10, "y": 10 + (idx*10), "width": 50, "height": 50}
-                })
+                metadata_json = _CLICK_META_TMPL.format(y=10 + (idx*10))
 
         row = {
             "QuestionKey": question_key,
             "Text": text_body,
             "IsCorrect": is_correct,
             "OrderIndex": idx,
-            "CorrectOrder": idx if q_type == 'drag_drop' else None,
+            "CorrectOrder": idx if is_sequence else None,
             "Metadata": metadata_json
         }
         options_rows.append(row)
         
     return options_rows
 
+# --------------------- EXPORT ---------------------
+
+def write_workbook(path: str, sheets: Dict[str, pd.DataFrame]) -> None:
+    """Writes every table into one workbook, one sheet per table, in dict order."""
+    with pd.ExcelWriter(path, engine=EXCEL_WRITE_ENGINE, engine_kwargs={"options": EXCEL_WRITE_OPTIONS}) as writer:
+        for sheet_name, table in sheets.items():
+            table.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def categorize_keys(table: pd.DataFrame) -> pd.DataFrame:
+    """Casts the repeated key/enum columns present in a table to categorical dtype."""
+    return table.astype({c: "category" for c in KEY_CATEGORY_COLUMNS if c in table.columns})
+
+def write_parquet_tables(out_dir: str, sheets: Dict[str, pd.DataFrame]) -> None:
+    """Writes each table to <out_dir>/<sheet>.parquet (zstd, dictionary-encoded keys)."""
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    for sheet_name, table in sheets.items():
+        table.to_parquet(
+            Path(out_dir) / f"{sheet_name.lower()}.parquet",
+            engine="pyarrow", compression="zstd", index=False
+        )
+
 # --------------------- MAIN ---------------------
 
 def main():
@@ -194,11 +291,15 @@ def main():
     parser.add_argument('--output', required=True)
     parser.add_argument('--collection', required=False)
     parser.add_argument('--lookup', required=False)
+    parser.add_argument('--parquet-dir', required=False, help="Also write each table as Parquet into this directory")
     args = parser.parse_args()
 
     try:
-        df = pd.read_excel(args.input)
+        df = pd.read_excel(args.input, engine=EXCEL_READ_ENGINE)
         df = normalize_columns(df)
+        if "Question_Type" not in df.columns: df["Question_Type"] = DEFAULT_QUESTION_TYPE
+        df = df.reindex(columns=INPUT_COLUMNS, fill_value="")
+        df = clean_columns(df)
     except Exception as e:
         print(f"Error: {e}")
         return
@@ -207,11 +308,11 @@ def main():
     image_lookup = {}
     if args.lookup:
         try:
-            with open(args.lookup, 'r') as f: image_lookup = json.load(f)
+            with open(args.lookup, 'rb') as f: image_lookup = orjson.loads(f.read())
         except: pass
 
     # Containers
-    tbl_questions = []
+    n_rows = len(df)
     tbl_options = []
     tbl_scenarios = []
     tbl_hints = []
@@ -219,88 +320,105 @@ def main():
     tbl_collections = {}
     tbl_categories = {}
     
-    seen_scenarios = {}
+    seen_scenarios = set()
     quiz_counters = {}
 
-    for idx, row in df.iterrows():
-        # Metadata Setup
-        cat_name = clean_text(row.get('Category')) or DEFAULT_CATEGORY_NAME
-        col_name = clean_text(row.get('Collection')) or args.collection or DEFAULT_COLLECTION_NAME
-        quiz_title = clean_text(row.get('Quiz')) or f"{col_name} - Batch 1"
-        
-        cat_key = make_key("CAT", cat_name)
-        col_key = make_key("COL", col_name)
-        quiz_key = make_key("QUIZ", quiz_title)
+    # Metadata Setup (column-wise): resolve defaults, then key each distinct name once
+    df["Category"] = df["Category"].replace("", DEFAULT_CATEGORY_NAME)
+    df["Collection"] = df["Collection"].replace("", args.collection or DEFAULT_COLLECTION_NAME)
+    df["Quiz"] = df["Quiz"].mask(df["Quiz"] == "", df["Collection"] + " - Batch 1")
+    df["CategoryKey"] = make_keys("CAT", df["Category"])
+    df["CollectionKey"] = make_keys("COL", df["Collection"])
+    df["QuizKey"] = make_keys("QUIZ", df["Quiz"])
+
+    # Scenario keys: factorize once (C hash pass), MD5 only per distinct scenario text.
+    # Short/blank scenarios become NaN -> code -1 -> no key.
+    scen_codes, scen_uniques = pd.factorize(df["Scenario"].where(df["Scenario"].str.len() > 15))
+    scen_keys = np.array([make_key("SCN", hashlib.md5(t.encode()).hexdigest()) for t in scen_uniques] + [None], dtype=object)
+    df["ScenarioKey"] = scen_keys[scen_codes]  # code -1 picks the trailing None
+
+    # --- NEW: DETERMINE VARIANT --- (all rows at once)
+    df["Variant"] = detect_hotspot_variants(df)
+
+    # Image Logic (all rows at once): lookup URL by question text, else has_image flag "1"
+    has_image_flag = pd.Series(np.where(df["has_image"].str.lower().isin(['true', '1', 'yes']), "1", ""), index=df.index)
+    media_urls = df["Question"].map(image_lookup).fillna(has_image_flag).to_numpy()
+
+    # Questions columns only known inside the loop: preallocated, filled by position
+    q_keys = np.empty(n_rows, dtype=object)
+    q_orders = np.empty(n_rows, dtype=np.int64)
+
+    # itertuples avoids building a Series per row (iterrows is the hot-path bottleneck)
+    # All fields arrive pre-cleaned (stripped strings, "" for missing)
+    for pos, (q_text, options_str, correct_str, hints, scen_text, q_type,
+              cat_name, col_name, quiz_title, cat_key, col_key, quiz_key,
+              scenario_key, q_variant) in enumerate(df[LOOP_COLUMNS].itertuples(index=False, name=None)):
 
         if cat_key not in tbl_categories:
             tbl_categories[cat_key] = {"CategoryKey": cat_key, "Name": cat_name, "Description": "", "Icon": "server", "Color": "#3B82F6", "IsActive": True}
         if col_key not in tbl_collections:
             tbl_collections[col_key] = {"CollectionKey": col_key, "Name": col_name, "CategoryKey": cat_key, "Difficulty": "medium", "IsPublic": True, "InstructorName": DEFAULT_INSTRUCTOR}
         if quiz_key not in tbl_quizzes:
-            tags = infer_tags(str(row.get('Question')), quiz_title)
+            tags = infer_tags(q_text, quiz_title)
             tbl_quizzes[quiz_key] = {"QuizKey": quiz_key, "Title": quiz_title, "CollectionKey": col_key, "PassMark": DEFAULT_PASSMARK, "IsPublic": True, "Tags": tags}
 
         # Question Setup
         quiz_counters.setdefault(quiz_key, 0)
         quiz_counters[quiz_key] += 1
         q_key = f"Q-{quiz_key}-{quiz_counters[quiz_key]:03d}"
-        q_type = clean_text(row.get('Question_Type', 'multiple_choice')).lower()
-        
-        # --- NEW: DETERMINE VARIANT ---
-        q_variant = None
-        if q_type == 'hotspot':
-            q_variant = detect_hotspot_variant(str(row.get('Question')), str(row.get('Options')))
         
-        # Scenario
-        scenario_key = None
-        scen_text = clean_text(row.get('Scenario'))
-        if scen_text and len(scen_text) > 15:
-            scen_hash = hashlib.md5(scen_text.encode()).hexdigest()
-            if scen_hash in seen_scenarios:
-                scenario_key = seen_scenarios[scen_hash]
-            else:
-                scenario_key = make_key("SCN", scen_hash)
-                seen_scenarios[scen_hash] = scenario_key
-                tbl_scenarios.append({
-                    "ScenarioKey": scenario_key, "QuizKey": quiz_key, "Title": f"Case Study {len(seen_scenarios)}",
-                    "Context": scen_text, "MediaUrl": "", "MediaType": "text", "TimeDuration": 600, "Order": len(seen_scenarios)
-                })
-
-        # Image Logic
-        media_val = ""
-        q_text = clean_text(row.get('Question'))
-        if q_text in image_lookup: media_val = image_lookup[q_text]
-        elif str(row.get('has_image')).lower() in ['true', '1', 'yes']: media_val = "1"
-
-        tbl_questions.append({
-            "QuestionKey": q_key, "QuizKey": quiz_key, "Type": q_type, 
-            "Variant": q_variant, # <--- NEW COLUMN
-            "Text": q_text,
-            "Explanation": clean_text(row.get('Explanation')), "Points": DEFAULT_POINTS,
-            "Order": quiz_counters[quiz_key], "ScenarioKey": scenario_key, "ScenarioOrder": 1 if scenario_key else None,
-            "CorrectAnswer": clean_text(row.get('Correct_Options')), "PartialScoring": q_type in ['multiple_answer', 'drag_drop'],
-            "MediaUrl": media_val
-        })
+        # Scenario (key precomputed; first occurrence emits the Scenarios row)
+        if scenario_key and scenario_key not in seen_scenarios:
+            seen_scenarios.add(scenario_key)
+            tbl_scenarios.append({
+                "ScenarioKey": scenario_key, "QuizKey": quiz_key, "Title": f"Case Study {len(seen_scenarios)}",
+                "Context": scen_text, "MediaUrl": "", "MediaType": "text", "TimeDuration": 600, "Order": len(seen_scenarios)
+            })
+
+        q_keys[pos] = q_key
+        q_orders[pos] = quiz_counters[quiz_key]
 
         # Options Parsing
-        opt_rows = parse_options_v2(q_key, q_type, q_variant, row.get('Options'), row.get('Correct_Options'))
+        opt_rows = parse_options_v2(q_key, q_type, q_variant, options_str, correct_str)
         tbl_options.extend(opt_rows)
 
         # Hints
-        if row.get('Hints'):
-            tbl_hints.append({"QuestionKey": q_key, "HintText": clean_text(row.get('Hints')), "HintOrder": 1, "PointsDeduction": 0})
+        if hints:
+            tbl_hints.append({"QuestionKey": q_key, "HintText": hints, "HintOrder": 1, "PointsDeduction": 0})
+
+    # Questions: loop-built arrays + input columns taken as-is (no per-row dicts)
+    scenario_keys = df["ScenarioKey"].to_numpy()
+    tbl_questions = pd.DataFrame({
+        "QuestionKey": q_keys, "QuizKey": df["QuizKey"].to_numpy(), "Type": df["Question_Type"].to_numpy(),
+        "Variant": df["Variant"].to_numpy(), "Text": df["Question"].to_numpy(), "Explanation": df["Explanation"].to_numpy(),
+        "Points": np.full(n_rows, DEFAULT_POINTS, dtype=np.int32), "Order": q_orders,
+        "ScenarioKey": scenario_keys, "ScenarioOrder": np.where(pd.notna(scenario_keys), 1, None),
+        "CorrectAnswer": df["Correct_Options"].to_numpy(),
+        "PartialScoring": df["Question_Type"].isin(['multiple_answer', 'drag_drop']).to_numpy(),
+        "MediaUrl": media_urls
+    }, columns=QUESTION_COLUMNS, copy=False)
 
     # Export
-    with pd.ExcelWriter(args.output, engine='openpyxl') as writer:
-        pd.DataFrame(list(tbl_categories.values())).to_excel(writer, "Categories", index=False)
-        pd.DataFrame(list(tbl_collections.values())).to_excel(writer, "Collections", index=False)
-        pd.DataFrame(list(tbl_quizzes.values())).to_excel(writer, "Quizzes", index=False)
-        pd.DataFrame(tbl_scenarios).to_excel(writer, "Scenarios", index=False)
-        pd.DataFrame(tbl_questions).to_excel(writer, "Questions", index=False)
-        pd.DataFrame(tbl_options).to_excel(writer, "Options", index=False)
-        pd.DataFrame(tbl_hints).to_excel(writer, "Hints", index=False)
-
-    print(f"V2.1 Transformation Complete: {len(tbl_questions)} questions processed.")
+    sheets = {
+        "Categories": pd.DataFrame.from_records(list(tbl_categories.values()), columns=CATEGORY_COLUMNS),
+        "Collections": pd.DataFrame.from_records(list(tbl_collections.values()), columns=COLLECTION_COLUMNS),
+        "Quizzes": pd.DataFrame.from_records(list(tbl_quizzes.values()), columns=QUIZ_COLUMNS),
+        "Scenarios": pd.DataFrame.from_records(tbl_scenarios, columns=SCENARIO_COLUMNS),
+        "Questions": tbl_questions,
+        "Options": pd.DataFrame.from_records(tbl_options, columns=OPTION_COLUMNS),
+        "Hints": pd.DataFrame.from_records(tbl_hints, columns=HINT_COLUMNS),
+    }
+    sheets = {name: categorize_keys(table) for name, table in sheets.items()}
+    if args.parquet_dir:
+        # pyarrow encodes outside the GIL, so Parquet overlaps the pure-Python xlsx serialization
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            jobs = [executor.submit(write_workbook, args.output, sheets),
+                    executor.submit(write_parquet_tables, args.parquet_dir, sheets)]
+            for job in jobs: job.result()
+    else:
+        write_workbook(args.output, sheets)
+
+    print(f"V2.1 Transformation Complete: {n_rows} questions processed.")
 
 if __name__ == "__main__":
     main()